@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for running the Budget Planner web app in production.
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+# app.py imports its sibling modules (csv_parser) from src/
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# With gthread workers this is only the heartbeat limit: a worker whose main loop stops
+# responding is restarted, but a request may run for longer. Uploads are bounded by
+# csv_parser instead, through OPENAI_TIMEOUT and the client's retries on each LLM call;
+# put a read timeout on the proxy in front if a hard limit per request is needed
+timeout = 120
+
+# Import the app once in the master so every worker shares the same module state
+preload_app = True
+
+
+def on_starting(server):
+    """Start the LiveKit agent once, from the master process."""
+    from app import start_agent
+
+    start_agent()
+
+
+def post_fork(server, worker):
+    """Workers inherit the agent handle on fork; only the master may stop the agent."""
+    import app
+
+    app.agent_process = None
+
+
+def on_exit(server):
+    """Stop the LiveKit agent when gunicorn shuts down."""
+    from app import stop_agent
+
+    stop_agent()
@@ -3,7 +3,9 @@ Flask web application for Budget Planner with CSV upload and LiveKit voice agent
 """
 
 from flask import Flask, request, jsonify, render_template, session, send_from_directory
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+import orjson
 import os
 import logging
 from werkzeug.utils import secure_filename
@@ -12,6 +14,7 @@ from livekit import api
 from datetime import timedelta
 from dotenv import load_dotenv
 import secrets
+import tempfile
 import subprocess
 import atexit
 import signal
@@ -20,7 +23,7 @@ import sys
 # Load environment variables from .env.local
 load_dotenv()
 
-from csv_parser import parse_csv_with_llm, save_transactions
+from csv_parser import parse_csv_with_llm, save_transactions, save_upload
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -49,7 +52,6 @@ def start_agent():
             cwd=project_root,
             stdout=None, # Inherit from parent
             stderr=None, # Inherit from parent
-            text=True,
         )
         logger.info(f"LiveKit agent started in 'dev' mode with PID: {agent_process.pid}")
     except Exception as e:
@@ -90,14 +92,25 @@ atexit.register(cleanup_on_exit)
 signal.signal(signal.SIGTERM, lambda signum, frame: cleanup_on_exit())
 signal.signal(signal.SIGINT, lambda signum, frame: (cleanup_on_exit(), sys.exit(0)))
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for faster response serialization."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
-app.secret_key = os.getenv("FLASK_SECRET_KEY", secrets.token_hex(32))
+app.json = OrjsonProvider(app)
 
 # Use absolute path for data directory to ensure Docker compatibility
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 UPLOAD_FOLDER = os.path.join(DATA_DIR, 'uploads')
-TRANSACTIONS_CSV = os.path.join(DATA_DIR, 'transactions.csv')
+TRANSACTIONS_PARQUET = os.path.join(DATA_DIR, 'transactions.parquet')
+SECRET_KEY_FILE = os.path.join(DATA_DIR, '.secret_key')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -110,13 +123,53 @@ CORS(app)
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+
+def load_secret_key():
+    """
+    Return the Flask secret key.
+    
+    Uses FLASK_SECRET_KEY if set; otherwise a random key persisted in DATA_DIR, so
+    sessions stay valid across restarts instead of being invalidated by a new key.
+    """
+    key = os.getenv("FLASK_SECRET_KEY")
+    if key:
+        return key
+    
+    if not os.path.exists(SECRET_KEY_FILE):
+        logger.warning(f"FLASK_SECRET_KEY not set, generating a persistent key in {SECRET_KEY_FILE}")
+        try:
+            fd = os.open(SECRET_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_bytes(32))
+        except FileExistsError:
+            pass  # Another process created it first
+    
+    with open(SECRET_KEY_FILE, 'rb') as f:
+        return f.read()
+
+
+app.secret_key = load_secret_key()
+
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'csv', 'txt'}
+ALLOWED_EXTENSIONS = frozenset({'.csv', '.txt'})
+
+# LiveKit credentials are read once at startup
+LIVEKIT_URL = os.getenv('LIVEKIT_URL')
+LIVEKIT_API_KEY = os.getenv('LIVEKIT_API_KEY')
+LIVEKIT_API_SECRET = os.getenv('LIVEKIT_API_SECRET')
+LIVEKIT_CONFIGURED = all([LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET])
 
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def df_to_records(df):
+    """Convert a DataFrame to a list of row dicts, column by column."""
+    cols = list(df.columns)
+    columns = [df[c].tolist() for c in cols]
+    return [dict(zip(cols, row)) for row in zip(*columns)]
 
 
 @app.route('/')
@@ -146,28 +199,29 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
         
-        # Save uploaded file with a fixed name to prevent file accumulation
-        # Use source.csv since parsing handles both csv and txt content
-        original_filename = "source.csv"
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], original_filename)
-        file.save(upload_path)
-        logger.info(f"Saved uploaded file to {upload_path}")
-        
-        # Read file content
-        with open(upload_path, 'r', encoding='utf-8') as f:
-            file_content = f.read()
-        
-        # Parse CSV using LLM
-        logger.info("Parsing CSV with LLM...")
-        df_parsed = parse_csv_with_llm(file_content)
+        # Give each upload its own file so concurrent uploads cannot overwrite each
+        # other before parsing; it is removed once parsed to prevent file accumulation.
+        # The .csv suffix is used since parsing handles both csv and txt content
+        fd, upload_path = tempfile.mkstemp(suffix='.csv', dir=app.config['UPLOAD_FOLDER'])
+        os.close(fd)
+        try:
+            # Werkzeug spools the upload to a temporary file; copy it to disk in chunks,
+            # hashing it in the same pass, so the whole file is never held as a string
+            content_hash = save_upload(file.stream, upload_path)
+            logger.info(f"Saved uploaded file to {upload_path}")
+            
+            # Parse CSV using LLM
+            logger.info("Parsing CSV with LLM...")
+            df_parsed = parse_csv_with_llm(upload_path, content_hash)
+        finally:
+            os.remove(upload_path)
         
-        # Save to single transactions.csv file (replaces previous uploads)
-        save_transactions(df_parsed, TRANSACTIONS_CSV)
-        logger.info(f"Saved parsed transactions to {TRANSACTIONS_CSV}")
+        # Save to single transactions.parquet file (replaces previous uploads)
+        save_transactions(df_parsed, TRANSACTIONS_PARQUET)
+        logger.info(f"Saved parsed transactions to {TRANSACTIONS_PARQUET}")
         
-        # Store in session
-        session['transactions'] = df_parsed.to_dict('records')
-        session['csv_path'] = TRANSACTIONS_CSV
+        # Only a flag goes in the (signed, not encrypted) cookie session; transactions are read back from disk
+        session['has_transactions'] = True
         
         logger.info(f"Successfully parsed {len(df_parsed)} transactions")
         
@@ -175,7 +229,7 @@ def upload_file():
             'success': True,
             'message': f'Successfully parsed {len(df_parsed)} transactions',
             'count': len(df_parsed),
-            'transactions': df_parsed.to_dict('records')
+            'transactions': df_to_records(df_parsed)
         })
         
     except Exception as e:
@@ -185,8 +239,11 @@ def upload_file():
 
 @app.route('/api/transactions', methods=['GET'])
 def get_transactions():
-    """Get parsed transactions from session."""
-    transactions = session.get('transactions', [])
+    """Get parsed transactions for the current session."""
+    transactions = []
+    
+    if session.get('has_transactions') and os.path.exists(TRANSACTIONS_PARQUET):
+        transactions = df_to_records(pd.read_parquet(TRANSACTIONS_PARQUET))
     
     if not transactions:
         return jsonify({'transactions': [], 'message': 'No transactions found. Please upload a CSV file.'}), 200
@@ -197,8 +254,12 @@ def get_transactions():
 @app.route('/api/livekit-token', methods=['POST'])
 def get_livekit_token():
     """Generate LiveKit access token for voice agent connection."""
+    if not LIVEKIT_CONFIGURED:
+        return jsonify({
+            'error': 'LiveKit credentials not configured. Please set LIVEKIT_URL, LIVEKIT_API_KEY, and LIVEKIT_API_SECRET in environment.'
+        }), 500
+    
     try:
-        # Get room name from request or use default
         # Get room name from request or use default with unique identifier
         data = request.get_json(silent=True) or {}
         # Always generate a unique room name to force a new agent session
@@ -207,18 +268,8 @@ def get_livekit_token():
         room_name = f"{base_room}-{secrets.token_hex(4)}"
         participant_name = data.get('participant', f'user-{secrets.token_hex(4)}')
         
-        # Get LiveKit credentials from environment
-        livekit_url = os.getenv('LIVEKIT_URL')
-        livekit_api_key = os.getenv('LIVEKIT_API_KEY')
-        livekit_api_secret = os.getenv('LIVEKIT_API_SECRET')
-        
-        if not all([livekit_url, livekit_api_key, livekit_api_secret]):
-            return jsonify({
-                'error': 'LiveKit credentials not configured. Please set LIVEKIT_URL, LIVEKIT_API_KEY, and LIVEKIT_API_SECRET in environment.'
-            }), 500
-        
         # Create access token
-        token = api.AccessToken(livekit_api_key, livekit_api_secret)
+        token = api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
         token.with_identity(participant_name)
         token.with_name(participant_name)
         token.with_grants(api.VideoGrants(
@@ -230,7 +281,7 @@ def get_livekit_token():
         
         return jsonify({
             'token': jwt_token,
-            'url': livekit_url,
+            'url': LIVEKIT_URL,
             'room': room_name,
             'participant': participant_name
         })
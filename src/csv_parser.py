@@ -4,15 +4,46 @@ Converts various CSV formats to internal format: Date, Description, Amount, Cate
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import csv
+import hashlib
+import itertools
 import json
 import logging
 import traceback
 from openai import OpenAI
 import os
-from typing import Dict, List
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks; cache writes are still atomic
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Parsed uploads are cached by content hash - use absolute path for Docker compatibility
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+LLM_CACHE_DIR = os.path.join(DATA_DIR, 'llm_cache')
+
+# Categories already assigned to merchants, shared across uploads
+MERCHANT_CACHE_PATH = os.path.join(DATA_DIR, 'merchant_cache.json')
+
+# In-process cache of parsed uploads, keyed by content hash; shared by the request threads
+MAX_CACHED_PARSES = 32
+_parse_cache: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+# Parsed uploads kept under LLM_CACHE_DIR; the least recently used beyond this are deleted
+MAX_CACHED_PARSE_FILES = 256
+
 # Fixed category list
 CATEGORIES = [
     "Retail", "Travel", "Entertainment", "Food & Dining",
@@ -20,111 +51,506 @@ CATEGORIES = [
     "Groceries", "Education", "Subscription"
 ]
 
+# Number of rows shown to the LLM when inferring the column mapping
+SAMPLE_ROWS = 5
+
+# Merchants per categorization request, so the structured reply stays well within the
+# model's output-token limit; up to CATEGORIZE_WORKERS requests run at once
+CATEGORIZE_BATCH_SIZE = 150
+CATEGORIZE_WORKERS = 4
+
+# Upper bound on a single LLM request, so a stalled call cannot hold a web worker thread;
+# an empty OPENAI_TIMEOUT (as in .env.example) keeps the default
+LLM_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT") or 60)
+
+
+# Fixed system prompts, built once; per-upload messages only carry the CSV header/samples or merchants
+COLUMN_MAPPING_SYSTEM_PROMPT = """You are a financial data parser that converts CSV files to a standardized format.
+Analyze the CSV columns and sample rows you are given and map the columns to the required format.
+
+**Required Output Format:**
+- Date: Transaction date
+- Description: Transaction description/merchant name
+- Amount: Transaction amount as a number (positive for income/credits, negative for expenses/debits)
+
+**Instructions:**
+1. Identify which columns map to Date, Description, and Amount
+2. If there are separate Debit/Credit columns, use type "debit_credit"; otherwise use type "single"
+3. For a single amount column, set "invert_sign" to true if expenses are shown as positive numbers
+4. Give the strftime format of the date column (e.g. "%Y-%m-%d" or "%d/%m/%Y")
+5. Set column fields that do not apply to null"""
+
+CATEGORIZE_SYSTEM_PROMPT = f"""You are a financial transaction categorizer.
+Categorize each merchant you are given from bank transaction descriptions.
+
+**Categories (use these only):** {', '.join(CATEGORIES)}
+
+Return one entry per merchant, with the merchant name exactly as given."""
 
-def parse_csv_with_llm(file_content: str) -> pd.DataFrame:
+# Strict structured-output schema for merchant categorization; the enum guarantees valid categories
+CATEGORIES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "categories": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "merchant": {"type": "string"},
+                    "category": {"type": "string", "enum": CATEGORIES},
+                },
+                "required": ["merchant", "category"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["categories"],
+    "additionalProperties": False,
+}
+
+
+def _column_mapping_schema(header: List[str]) -> Dict:
+    """Strict structured-output schema for the column mapping; column names must come from the header."""
+    column = {"type": "string", "enum": header}
+    optional_column = {"anyOf": [column, {"type": "null"}]}
+    return {
+        "type": "object",
+        "properties": {
+            "column_mapping": {
+                "type": "object",
+                "properties": {
+                    "date_column": column,
+                    "date_format": {"type": "string"},
+                    "description_column": column,
+                    "amount_columns": {
+                        "type": "object",
+                        "properties": {
+                            "type": {"type": "string", "enum": ["single", "debit_credit"]},
+                            "debit": optional_column,
+                            "credit": optional_column,
+                            "single": optional_column,
+                            "invert_sign": {"type": "boolean"},
+                        },
+                        "required": ["type", "debit", "credit", "single", "invert_sign"],
+                        "additionalProperties": False,
+                    },
+                },
+                "required": ["date_column", "date_format", "description_column", "amount_columns"],
+                "additionalProperties": False,
+            }
+        },
+        "required": ["column_mapping"],
+        "additionalProperties": False,
+    }
+
+
+@lru_cache(maxsize=1)
+def _get_client() -> OpenAI:
+    """Return the shared OpenAI client, so uploads reuse its HTTP connection pool."""
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT, max_retries=2)
+
+
+def _chat_json(client: OpenAI, system: str, prompt: str, schema_name: str, schema: Dict) -> Dict:
+    """Run a chat completion constrained to a strict JSON schema and return the parsed result."""
+    response = client.chat.completions.create(
+        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": schema_name, "strict": True, "schema": schema},
+        }
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+def _read_header_and_samples(csv_path: str, n_rows: int = SAMPLE_ROWS):
     """
-    Parse CSV content using LLM to intelligently map columns to internal format.
+    Read the header and the first few rows without parsing the whole file.
     
     Args:
-        file_content: Raw CSV content as string
+        csv_path: Path to the CSV file
+        n_rows: Number of sample rows to return
         
     Returns:
-        DataFrame with columns: Date, Description, Amount, Category
+        Tuple of (header, sample_rows)
     """
+    # utf-8-sig drops the byte-order mark Excel and many bank exports put before the header
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        samples = list(itertools.islice(reader, n_rows))
+    
+    if not header:
+        raise ValueError("CSV file is empty")
+    return header, samples
+
+
+def _to_number(series: pd.Series) -> pd.Series:
+    """
+    Convert an amount column to floats, stripping currency symbols and separators.
+    
+    Accounting negatives "(85.50)" and trailing minus signs "85.50-" become negative.
+    When the column writes decimals with a comma ("1.234,56") and never with a
+    point, "." is read as the thousands separator instead.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    text = series.astype("string").str.strip()
+    negative = (text.str.contains(r"\(.*\)") | text.str.endswith("-")).fillna(False).astype(bool)
+    cleaned = text.str.replace(r"[^\d.,\-]", "", regex=True).str.rstrip("-")
+    decimal_comma = (
+        cleaned.str.contains(r",\d{1,2}$").any() and not cleaned.str.contains(r"\.\d{1,2}$").any()
+    )
+    if decimal_comma:
+        cleaned = cleaned.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        cleaned = cleaned.str.replace(",", "", regex=False)
+    number = pd.to_numeric(cleaned, errors="coerce").astype(float)
+    return number.where(~negative, -number.abs())
+
+
+def _mapped_columns(mapping: Dict) -> List[str]:
+    """Return the raw CSV columns referenced by the LLM's column mapping."""
+    amount_columns = mapping["amount_columns"]
+    columns = [mapping["date_column"], mapping["description_column"]]
+    if amount_columns.get("type") == "debit_credit":
+        columns += [amount_columns["debit"], amount_columns["credit"]]
+    else:
+        columns.append(amount_columns["single"])
+    return list(dict.fromkeys(columns))
+
+
+def _read_mapped_columns(csv_path: str, mapping: Dict) -> pd.DataFrame:
+    """
+    Read only the mapped columns of the CSV, using the multithreaded pyarrow reader.
+    
+    Args:
+        csv_path: Path to the CSV file
+        mapping: The "column_mapping" object returned by the LLM
+        
+    Returns:
+        DataFrame with the mapped raw columns
+    """
+    usecols = _mapped_columns(mapping)
+    # Descriptions stay text, so check numbers and references keep leading zeros and never
+    # gain ".0". pandas' pyarrow engine infers types first and casts afterwards, so the
+    # column type is given to pyarrow's reader directly
+    description = mapping["description_column"]
     try:
-        # First, try to read the CSV to understand its structure
-        from io import StringIO
-        df_raw = pd.read_csv(StringIO(file_content))
+        convert_options = pa_csv.ConvertOptions(include_columns=usecols, column_types={description: pa.string()})
+        return pa_csv.read_csv(csv_path, convert_options=convert_options).to_pandas()
+    except (ValueError, pa.ArrowException) as e:
+        # pyarrow rejects some malformed files (e.g. ragged rows) that the C engine tolerates,
+        # and reports column lookups as ArrowKeyError, which is not a ValueError
+        logger.warning(f"pyarrow CSV reader failed, falling back to C engine: {e}")
+        return pd.read_csv(csv_path, usecols=usecols, dtype={description: str})
+
+
+def _apply_column_mapping(df_raw: pd.DataFrame, mapping: Dict) -> pd.DataFrame:
+    """
+    Build Date, Description and Amount columns from the raw CSV using the LLM's column mapping.
+    
+    Args:
+        df_raw: Raw CSV data
+        mapping: The "column_mapping" object returned by the LLM
         
-        logger.info(f"Raw CSV columns: {df_raw.columns.tolist()}")
-        logger.info(f"Raw CSV shape: {df_raw.shape}")
+    Returns:
+        DataFrame with columns: Date, Description, Amount
+    """
+    amount_columns = mapping["amount_columns"]
+    
+    if amount_columns.get("type") == "debit_credit":
+        debit = _to_number(df_raw[amount_columns["debit"]]).fillna(0).abs()
+        credit = _to_number(df_raw[amount_columns["credit"]]).fillna(0).abs()
+        amount = credit - debit
+    else:
+        amount = _to_number(df_raw[amount_columns["single"]])
+        if amount_columns.get("invert_sign"):
+            amount = -amount
+    
+    date_format = mapping.get("date_format") or None
+    dates = pd.to_datetime(df_raw[mapping["date_column"]], format=date_format, errors="coerce")
+    
+    # Unparseable values become NaN/NaT; make a wrong date_format or amount column visible
+    missing_dates = int(dates.isna().sum())
+    missing_amounts = int(amount.isna().sum())
+    if missing_dates or missing_amounts:
+        logger.warning(
+            f"{missing_dates} of {len(df_raw)} rows have no parseable date (format {date_format!r}), "
+            f"{missing_amounts} have no parseable amount"
+        )
+    
+    return pd.DataFrame({
+        "Date": dates.dt.strftime("%Y-%m-%d"),
+        "Description": df_raw[mapping["description_column"]].fillna("").astype(str).str.strip(),
+        "Amount": amount,
+    })
+
+
+def _merchant_keys(descriptions: pd.Series) -> pd.Series:
+    """Normalize descriptions to merchant stems: lowercase, digits dropped, whitespace collapsed."""
+    return (
+        descriptions.str.lower()
+        .str.replace(r"\d+", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def _load_merchant_cache() -> Dict[str, str]:
+    """Load the persistent merchant -> category cache, or an empty one."""
+    try:
+        with open(MERCHANT_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable merchant cache {MERCHANT_CACHE_PATH}: {e}")
+        return {}
+
+
+def _save_merchant_cache(new_entries: Dict[str, str]):
+    """
+    Merge new merchant -> category entries into the persistent cache.
+    
+    The cache is re-read and merged under an exclusive lock, then swapped in via a
+    unique temporary file, so concurrent uploads in other workers neither corrupt
+    the file nor drop each other's entries.
+    """
+    try:
+        cache_dir = os.path.dirname(MERCHANT_CACHE_PATH)
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(f"{MERCHANT_CACHE_PATH}.lock", 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            cache = _load_merchant_cache()
+            cache.update(new_entries)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".json")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, MERCHANT_CACHE_PATH)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+    except Exception as e:
+        logger.warning(f"Could not write merchant cache {MERCHANT_CACHE_PATH}: {e}")
+
+
+def _categorize_batch(client: OpenAI, merchants: List[str]) -> Dict[str, str]:
+    """Categorize one batch of merchants; a failed request categorizes none of them."""
+    try:
+        result = _chat_json(
+            client,
+            CATEGORIZE_SYSTEM_PROMPT,
+            f"**Merchants:**\n{json.dumps(merchants, indent=2)}",
+            "merchant_categories",
+            CATEGORIES_SCHEMA,
+        )
+    except Exception as e:
+        logger.warning(f"Categorizing {len(merchants)} merchants failed, they fall back to 'Other': {e}")
+        return {}
+    # Names the model rewrote match no merchant; dropping them keeps them out of the cache
+    requested = set(merchants)
+    return {item["merchant"]: item["category"] for item in result["categories"] if item["merchant"] in requested}
+
+
+def _categorize_descriptions(client: OpenAI, merchants: List[str]) -> Dict[str, str]:
+    """
+    Ask the LLM to categorize each merchant once, CATEGORIZE_BATCH_SIZE merchants per request.
+    
+    Args:
+        client: OpenAI client
+        merchants: Unique normalized merchant names
         
-        # Get sample rows for LLM analysis
-        sample_rows = df_raw.head(5).to_dict('records')
+    Returns:
+        Mapping of merchant to category, for the requested merchants the LLM answered
+    """
+    if not merchants:
+        return {}
+    
+    batches = [merchants[i:i + CATEGORIZE_BATCH_SIZE] for i in range(0, len(merchants), CATEGORIZE_BATCH_SIZE)]
+    if len(batches) == 1:
+        return _categorize_batch(client, batches[0])
+    categories = {}
+    with ThreadPoolExecutor(max_workers=CATEGORIZE_WORKERS) as pool:
+        for batch_categories in pool.map(lambda batch: _categorize_batch(client, batch), batches):
+            categories.update(batch_categories)
+    return categories
+
+
+def _file_digest(csv_path: str) -> str:
+    """Return a content hash of the file, read in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_upload(stream, output_path: str) -> str:
+    """
+    Copy an uploaded file stream to disk in chunks, hashing it on the way.
+    
+    Args:
+        stream: Binary file-like object with the upload
+        output_path: Path to save the file
         
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    Returns:
+        Content hash of the file, as used for the parse cache
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(output_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(1 << 16), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def parse_csv_with_llm(csv_path: str, content_hash: Optional[str] = None) -> pd.DataFrame:
+    """
+    Parse CSV content using LLM, reusing earlier results for identical files.
+    
+    Results are cached in memory and as Parquet files under LLM_CACHE_DIR, keyed
+    by a hash of the file content, so re-uploading a statement skips the LLM.
+    
+    Args:
+        csv_path: Path to the uploaded CSV file
+        content_hash: Hash returned by save_upload; computed from the file if omitted
         
-        # Create prompt for LLM to map columns
-        prompt = f"""You are a financial data parser. Analyze this CSV data and map it to the required format.
+    Returns:
+        DataFrame with columns: Date, Description, Amount, Category
+    """
+    key = content_hash or _file_digest(csv_path)
+    
+    with _parse_cache_lock:
+        cached = _parse_cache.get(key)
+        if cached is not None:
+            _parse_cache.move_to_end(key)
+    if cached is not None:
+        logger.info(f"Using in-memory parse cache for {key}")
+        return cached.copy()
+    
+    cache_path = os.path.join(LLM_CACHE_DIR, f"{key}.parquet")
+    df_parsed = _read_cached_parse(cache_path)
+    if df_parsed is None:
+        df_parsed = _parse_csv_uncached(csv_path)
+        try:
+            os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+            _write_parquet_atomic(df_parsed, cache_path)
+            _prune_cached_parses()
+        except Exception as e:
+            logger.warning(f"Could not write parse cache {cache_path}: {e}")
+    
+    with _parse_cache_lock:
+        _parse_cache[key] = df_parsed
+        if len(_parse_cache) > MAX_CACHED_PARSES:
+            _parse_cache.popitem(last=False)
+    
+    return df_parsed.copy()
 
-**Input CSV Columns:** {df_raw.columns.tolist()}
 
-**Sample Rows (first 5):**
-{json.dumps(sample_rows, indent=2, default=str)}
+def _read_cached_parse(cache_path: str) -> Optional[pd.DataFrame]:
+    """Load a parse from the on-disk cache and mark it as recently used, or return None."""
+    try:
+        df_parsed = pd.read_parquet(cache_path)
+    except FileNotFoundError:
+        # Never cached, or evicted by another worker
+        return None
+    logger.info(f"Using cached parse from {cache_path}")
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return df_parsed
 
-**Required Output Format:**
-- Date: Transaction date (convert to YYYY-MM-DD format)
-- Description: Transaction description/merchant name
-- Amount: Transaction amount as a number (positive for income/credits, negative for expenses/debits)
-- Category: One of these categories only: {', '.join(CATEGORIES)}
 
-**Instructions:**
-1. Identify which columns map to Date, Description, and Amount
-2. For each transaction, determine the appropriate Category from the list above
-3. If there are separate Debit/Credit columns, combine them into Amount (credits positive, debits negative)
-4. Categorize transactions based on description/merchant name
-5. Return a JSON object with this structure:
-
-{{
-  "column_mapping": {{
-    "date_column": "name_of_date_column",
-    "description_column": "name_of_description_column",
-    "amount_columns": {{"type": "single|debit_credit", "debit": "column_name", "credit": "column_name", "single": "column_name"}}
-  }},
-  "transactions": [
-    {{
-      "Date": "2024-01-15",
-      "Description": "Amazon Purchase",
-      "Amount": -50.00,
-      "Category": "Retail"
-    }}
-  ]
-}}
-
-Parse ALL rows from the CSV, not just the sample.
-
-CSV Data:
-{file_content}"""
-
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": "You are a financial data parser that converts CSV files to a standardized format. Always return valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,
-            response_format={"type": "json_object"}
-        )
+def _prune_cached_parses():
+    """Delete the least recently used parses beyond MAX_CACHED_PARSE_FILES from LLM_CACHE_DIR."""
+    entries = []
+    with os.scandir(LLM_CACHE_DIR) as it:
+        for entry in it:
+            # Skip the temporary files of writes still in progress
+            if entry.name.endswith(".parquet") and not entry.name.startswith("tmp"):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    pass
+    entries.sort()
+    for _, path in entries[:max(len(entries) - MAX_CACHED_PARSE_FILES, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _parse_csv_uncached(csv_path: str) -> pd.DataFrame:
+    """
+    Parse CSV content using LLM to intelligently map columns to internal format.
+    
+    Only the header and a few sample rows are sent to the LLM to obtain a column
+    mapping; the rows themselves are converted locally with pandas. Categories are
+    requested once per unique description.
+    
+    Args:
+        csv_path: Path to the uploaded CSV file
         
-        result = json.loads(response.choices[0].message.content)
+    Returns:
+        DataFrame with columns: Date, Description, Amount, Category
+    """
+    try:
+        header, sample_rows = _read_header_and_samples(csv_path)
+        
+        logger.info(f"Raw CSV columns: {header}")
+        
+        client = _get_client()
+        
+        # Only the per-file part is formatted here; the instructions are a fixed system prompt
+        prompt = f"""**Input CSV Columns:** {header}
+
+**Sample Rows (first {len(sample_rows)}):**
+{json.dumps(sample_rows, indent=2)}"""
+
+        result = _chat_json(
+            client,
+            COLUMN_MAPPING_SYSTEM_PROMPT,
+            prompt,
+            "column_mapping",
+            _column_mapping_schema(list(dict.fromkeys(header))),
+        )
         logger.info(f"LLM parsing result: {json.dumps(result, indent=2)}")
+        mapping = result["column_mapping"]
         
-        # Convert to DataFrame
-        if "transactions" in result and result["transactions"]:
-            df_parsed = pd.DataFrame(result["transactions"])
-            
-            # Ensure all required columns exist
-            required_columns = ["Date", "Description", "Amount", "Category"]
-            for col in required_columns:
-                if col not in df_parsed.columns:
-                    raise ValueError(f"Missing required column: {col}")
-            
-            # Validate categories
-            invalid_categories = df_parsed[~df_parsed["Category"].isin(CATEGORIES)]["Category"].unique()
-            if len(invalid_categories) > 0:
-                logger.warning(f"Found invalid categories, mapping to 'Other': {invalid_categories}")
-                df_parsed.loc[~df_parsed["Category"].isin(CATEGORIES), "Category"] = "Other"
-            
-            # Ensure Amount is numeric
-            df_parsed["Amount"] = pd.to_numeric(df_parsed["Amount"], errors="coerce")
-            
-            # Ensure Date is in proper format
-            df_parsed["Date"] = pd.to_datetime(df_parsed["Date"], errors="coerce").dt.strftime("%Y-%m-%d")
-            
-            logger.info(f"Successfully parsed {len(df_parsed)} transactions")
-            return df_parsed[required_columns]
-        else:
-            raise ValueError("No transactions found in LLM response")
+        # Materialize the rows locally instead of asking the LLM to echo them back
+        df_raw = _read_mapped_columns(csv_path, mapping)
+        logger.info(f"Raw CSV shape: {df_raw.shape}")
+        df_parsed = _apply_column_mapping(df_raw, mapping)
+        
+        # Categorize each merchant once; merchants seen in earlier uploads come from the cache
+        merchant_keys = _merchant_keys(df_parsed["Description"])
+        categories = _load_merchant_cache()
+        new_merchants = [m for m in merchant_keys.unique().tolist() if m not in categories]
+        logger.info(f"Categorizing {len(new_merchants)} new merchants with LLM")
+        
+        if new_merchants:
+            # The strict schema guarantees every category is one of CATEGORIES
+            new_categories = _categorize_descriptions(client, new_merchants)
+            categories.update(new_categories)
+            if new_categories:
+                _save_merchant_cache(new_categories)
+        
+        # Merchants the LLM skipped or failed on fall back to 'Other' (and are asked again next time)
+        df_parsed["Category"] = pd.Categorical(
+            merchant_keys.map(categories).fillna("Other"), categories=CATEGORIES
+        )
+        
+        required_columns = ["Date", "Description", "Amount", "Category"]
+        logger.info(f"Successfully parsed {len(df_parsed)} transactions")
+        return df_parsed[required_columns]
             
     except Exception as e:
         logger.error(f"Error parsing CSV with LLM: {e}")
@@ -132,18 +558,35 @@ CSV Data:
         raise
 
 
-def save_transactions(df: pd.DataFrame, output_path: str = "transactions.csv"):
+def _write_parquet_atomic(df: pd.DataFrame, output_path: str):
+    """
+    Write a DataFrame to Parquet via a unique temporary file that is then swapped in.
+    
+    Readers never see a partial file, and concurrent writers each get their own
+    temporary file, so the last complete write wins.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path) or ".", suffix=".parquet")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def save_transactions(df: pd.DataFrame, output_path: str = "transactions.parquet"):
     """
-    Save parsed transactions to CSV file.
+    Save parsed transactions to a Parquet file.
     
     Args:
         df: DataFrame with parsed transactions
-        output_path: Path to save CSV file
+        output_path: Path to save Parquet file
     """
     # Ensure directory exists
     output_dir = os.path.dirname(output_path)
     if output_dir:  # Only create if there's a directory component
         os.makedirs(output_dir, exist_ok=True)
     
-    df.to_csv(output_path, index=False)
+    _write_parquet_atomic(df, output_path)
     logger.info(f"Saved {len(df)} transactions to {output_path}")
@@ -1,9 +1,15 @@
+import asyncio
+import builtins
 import os
+import re
+import threading
 import pandas as pd
-from typing import Annotated, Literal, TypedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Annotated, AsyncIterator, Literal, Optional, TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 import logging
@@ -13,71 +19,296 @@ logger = logging.getLogger("agent")
 # Load data at module level - use absolute path for Docker compatibility
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
-CSV_PATH = os.path.join(DATA_DIR, 'transactions.csv')
-df = pd.DataFrame(columns=["Date", "Description", "Amount", "Category"])
+TRANSACTIONS_PATH = os.path.join(DATA_DIR, 'transactions.parquet')
+# Column types exposed to the analysis code; Date is parsed to datetime64 separately.
+# Description is Arrow-backed so .str filters (merchant lookups) run on Arrow compute kernels
+DTYPES = {"Description": "string[pyarrow]", "Amount": "float64", "Category": "category"}
 
-def reload_csv_data(csv_path: str = None):
+def _with_dtypes(frame: pd.DataFrame) -> pd.DataFrame:
+    """Apply the typed schema so analysis code gets real dates, numbers and categoricals."""
+    frame = frame.astype(DTYPES)
+    frame["Date"] = pd.to_datetime(frame["Date"], format="%Y-%m-%d", errors="coerce")
+    return frame
+
+df = _with_dtypes(pd.DataFrame(columns=["Date", "Description", "Amount", "Category"]))
+
+# Last loaded file identity (path, mtime, size, inode), its dataframe and the
+# pre-split expense/income views and monthly pivot derived from it
+_CACHE = {"key": None, "df": None, "expenses": None, "income": None, "monthly": None}
+
+# query_finances results keyed by (file key, op, category, start, end, n);
+# cleared whenever a new file is loaded
+_AGG_CACHE = {}
+_LOAD_LOCK = threading.Lock()
+
+def _split_frames(frame: pd.DataFrame):
+    """Split transactions into expenses (Amount as a positive value) and income."""
+    expenses = frame[frame["Amount"] < 0].assign(Amount=lambda d: d["Amount"].abs())
+    income = frame[frame["Amount"] > 0]
+    return expenses, income
+
+def _monthly_pivot(expenses: pd.DataFrame) -> pd.DataFrame:
+    """Expense totals as a YYYY-MM x Category table, zero where nothing was spent."""
+    return expenses.pivot_table(
+        index=expenses["Date"].dt.strftime("%Y-%m").rename("Month"),
+        columns="Category",
+        values="Amount",
+        aggfunc="sum",
+        fill_value=0.0,
+        observed=True,
+    )
+
+def reload_transactions(path: Optional[str] = None):
     """
-    Reload CSV data from file.
+    Reload transaction data from the Parquet store written by the web app.
+    
+    The file is only re-read when it has changed since the last load.
     
     Args:
-        csv_path: Path to CSV file. If None, uses default CSV_PATH.
+        path: Path to Parquet file. If None, uses default TRANSACTIONS_PATH.
     """
     global df
-    path = csv_path or CSV_PATH
+    path = path or TRANSACTIONS_PATH
+    
+    try:
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size, st.st_ino)
+    except FileNotFoundError:
+        key = (path, None)
     
-    if os.path.exists(path):
-        df = pd.read_csv(path)
-        logger.info(f"Loaded {len(df)} transactions from {path}")
-    else:
-        df = pd.DataFrame(columns=["Date", "Description", "Amount", "Category"])
-        logger.warning(f"CSV file not found: {path}, using empty dataframe")
+    if key == _CACHE["key"]:
+        df = _CACHE["df"]
+        return df
     
+    # Tools run in worker threads; load each new file once, not once per concurrent caller
+    with _LOAD_LOCK:
+        if key == _CACHE["key"]:
+            df = _CACHE["df"]
+            return df
+        
+        if key[1] is not None:
+            df = _with_dtypes(pd.read_parquet(path, columns=["Date", "Description", "Amount", "Category"]))
+            logger.info(f"Loaded {len(df)} transactions from {path}")
+        else:
+            df = _with_dtypes(pd.DataFrame(columns=["Date", "Description", "Amount", "Category"]))
+            logger.warning(f"Transactions file not found: {path}, using empty dataframe")
+        
+        _AGG_CACHE.clear()
+        _CACHE["df"] = df
+        _CACHE["expenses"], _CACHE["income"] = _split_frames(df)
+        _CACHE["monthly"] = _monthly_pivot(_CACHE["expenses"])
+        _CACHE["key"] = key
     return df
 
 # Initialize data
-reload_csv_data()
+reload_transactions()
+
+@lru_cache(maxsize=256)
+def _compile(src: str):
+    """Compile tool code once; the model often repeats the same snippet across turns."""
+    return compile(src, "<analyze_finances>", "exec")
+
+# Limits on model-written code: longer snippets are rejected outright and slow
+# ones stop blocking the turn after EXEC_TIMEOUT seconds. A thread cannot be
+# stopped, so a runaway snippet keeps its worker until it finishes; running in a
+# dedicated pool keeps that from starving the default executor other tools use.
+MAX_CODE_LENGTH = 4096
+EXEC_TIMEOUT = 5.0
+_EXEC_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="analyze_finances")
+
+# The only builtins tool code may use; no imports, file or attribute access
+SAFE_BUILTINS = {
+    name: getattr(builtins, name)
+    for name in (
+        "abs", "all", "any", "bool", "dict", "enumerate", "filter", "float", "int",
+        "isinstance", "len", "list", "map", "max", "min", "range", "round", "set",
+        "sorted", "str", "sum", "tuple", "zip",
+    )
+}
+
+def _execute_code(code: str) -> str:
+    """Run tool code on the current data, reusing the result of an identical earlier run."""
+    # Reload transactions to get latest data (cached until the file changes)
+    reload_transactions()
+    return _run_code(code, _CACHE["key"])
+
+@lru_cache(maxsize=512)
+def _run_code(code: str, data_key: tuple) -> str:
+    """
+    Execute tool code against copies of the cached frames and return its result as text.
+    
+    data_key is the identity of the loaded file, so a cached result is only reused
+    until the transactions change. Errors and timeouts raise and are not cached.
+    """
+    # Create a safe local dictionary with allowed modules and copies of the frames,
+    # so code that modifies them cannot corrupt the cache
+    local_vars = {
+        "df": _CACHE["df"].copy(),
+        "expenses": _CACHE["expenses"].copy(),
+        "income": _CACHE["income"].copy(),
+        "monthly": _CACHE["monthly"].copy(),
+        "pd": pd,
+    }
+    # Execute the code
+    exec(_compile(code), {"__builtins__": SAFE_BUILTINS}, local_vars)
+    return str(local_vars.get("result", "No result variable set."))
 
 # Define tools
 @tool
-def analyze_finances(code: str):
+async def analyze_finances(code: str):
     """
     Execute Python code to analyze financial data using pandas.
-    The dataframe 'df' is available with columns: Date, Description, Amount, Category.
+    The dataframe 'df' is available with columns: Date (datetime), Description, Amount, Category (categorical).
+    'expenses' holds only the spending rows with Amount as a positive value, and
+    'income' holds only the rows with Amount > 0.
+    'monthly' is a pivot of expense totals with one row per month (YYYY-MM) and one column per Category.
     The code must set a variable named 'result' with the final answer.
     Example:
-    result = df[df['Category'] == 'Food']['Amount'].sum()
+    result = expenses[expenses['Category'] == 'Groceries']['Amount'].sum()
     """
+    if len(code) > MAX_CODE_LENGTH:
+        return f"Error executing code: code is longer than {MAX_CODE_LENGTH} characters."
     try:
-        # Reload CSV to get latest data
-        current_df = reload_csv_data()
-        
-        # Create a safe local dictionary with allowed modules and the dataframe
-        local_vars = {"df": current_df, "pd": pd}
-        # Execute the code
-        exec(code, {"__builtins__": {}}, local_vars)
-        return str(local_vars.get("result", "No result variable set."))
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(_EXEC_POOL, _execute_code, code), timeout=EXEC_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return f"Error executing code: timed out after {EXEC_TIMEOUT:g} seconds."
     except Exception as e:
         return f"Error executing code: {e}"
 
-tools = [analyze_finances]
+def _filter_frame(frame: pd.DataFrame, category: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """Narrow a transactions frame to one category and/or an inclusive date range."""
+    if category:
+        frame = frame[frame["Category"].astype("string").str.lower() == category.lower()]
+    if start:
+        frame = frame[frame["Date"] >= pd.Timestamp(start)]
+    if end:
+        frame = frame[frame["Date"] <= pd.Timestamp(end)]
+    return frame
+
+def _sum_by(frame: pd.DataFrame, key, n: Optional[int] = None):
+    totals = frame.groupby(key, observed=True)["Amount"].sum().sort_values(ascending=False)
+    if n is not None:
+        totals = totals.head(n)
+    return totals.round(2).to_dict()
+
+# Prebuilt aggregations for query_finances; each takes the (already filtered)
+# expenses and income frames and the requested row limit
+_OPS = {
+    "total_expenses": lambda expenses, income, n: round(float(expenses["Amount"].sum()), 2),
+    "total_income": lambda expenses, income, n: round(float(income["Amount"].sum()), 2),
+    "sum_by_category": lambda expenses, income, n: _sum_by(expenses, "Category"),
+    "monthly_expenses": lambda expenses, income, n: _sum_by(
+        expenses, expenses["Date"].dt.strftime("%Y-%m")
+    ),
+    "top_merchants": lambda expenses, income, n: _sum_by(expenses, "Description", n),
+    "largest_expenses": lambda expenses, income, n: expenses.nlargest(n, "Amount")[
+        ["Date", "Description", "Amount", "Category"]
+    ].assign(Date=lambda d: d["Date"].dt.strftime("%Y-%m-%d")).to_dict("records"),
+    "transaction_count": lambda expenses, income, n: {
+        "expenses": len(expenses), "income": len(income)
+    },
+}
+
+@tool
+def query_finances(op: str, category: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, n: int = 5):
+    """
+    Run a prebuilt aggregation over the transactions, without writing code.
+    Expense amounts are reported as positive values.
+    op is one of: total_expenses, total_income, sum_by_category, monthly_expenses,
+    top_merchants, largest_expenses, transaction_count.
+    Optional filters: category (e.g. 'Groceries'), start and end dates (YYYY-MM-DD, inclusive).
+    n limits the rows returned by top_merchants and largest_expenses.
+    """
+    if op not in _OPS:
+        return f"Unknown op '{op}'. Available ops: {', '.join(_OPS)}"
+    try:
+        if category:
+            # A misspelt or made-up category would otherwise filter everything out and report 0
+            reload_transactions()
+            known = sorted(_CACHE["df"]["Category"].dropna().astype(str).unique())
+            if category.lower() not in {c.lower() for c in known}:
+                return f"Unknown category '{category}'. Available categories: {', '.join(known)}"
+        return _query(op, category, start, end, n)
+    except Exception as e:
+        return f"Error running query: {e}"
+
+def _query(op: str, category: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, n: int = 5) -> str:
+    """Run an op on the current data, reusing an earlier result for the same file and arguments."""
+    reload_transactions()
+    cache_key = (_CACHE["key"], op, category, start, end, n)
+    result = _AGG_CACHE.get(cache_key)
+    if result is None:
+        expenses = _filter_frame(_CACHE["expenses"], category, start, end)
+        income = _filter_frame(_CACHE["income"], category, start, end)
+        result = str(_OPS[op](expenses, income, n))
+        _AGG_CACHE[cache_key] = result
+    return result
+
+# Ops the model asks for on most budget questions; computed speculatively at the
+# start of each turn so the tool call usually finds its answer already cached
+PREFETCH_OPS = ("total_expenses", "total_income", "sum_by_category", "monthly_expenses", "top_merchants")
+
+def _prefetch_common_aggregates():
+    try:
+        for op in PREFETCH_OPS:
+            _query(op)
+    except Exception as e:
+        logger.warning(f"Prefetching aggregates failed: {e}")
+
+# Keep references to running prefetch tasks so they are not garbage collected mid-flight
+_PREFETCH_TASKS = set()
+
+def _start_prefetch():
+    """Warm _AGG_CACHE in a worker thread while the model decodes its first reply."""
+    task = asyncio.create_task(asyncio.to_thread(_prefetch_common_aggregates))
+    _PREFETCH_TASKS.add(task)
+    task.add_done_callback(_PREFETCH_TASKS.discard)
+
+tools = [query_finances, analyze_finances]
+TOOLS_BY_NAME = {t.name: t for t in tools}
 
 # Define logic
 class State(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
 
-def chatbot(state: State):
-    model_name = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    llm = ChatOpenAI(model=model_name, temperature=0) # Using model from env
-    llm_with_tools = llm.bind_tools(tools)
+# Per-request limits for the agent's chat model, kept apart from the CSV parser's
+# OPENAI_TIMEOUT; empty values (as in .env.example) keep the defaults. See
+# FIRST_TOKEN_TIMEOUT in llm_adapter for how these relate to the voice turn deadline
+AGENT_LLM_TIMEOUT = float(os.getenv("AGENT_LLM_TIMEOUT") or 8)
+AGENT_LLM_MAX_RETRIES = int(os.getenv("AGENT_LLM_MAX_RETRIES") or 2)
+
+@lru_cache(maxsize=4)
+def _get_llm(model_name: str):
+    """
+    Build the tool-bound chat model once per model name.
     
-    system_prompt = """You are a specialized Budget Assistant.
+    Reusing it keeps the underlying HTTP client (and its keep-alive connections) across turns.
+    """
+    # prompt_cache_key routes turns to the same provider-side prompt cache for the shared system prompt;
+    # a short per-request timeout retries a slow tail request instead of stalling the voice turn
+    llm = ChatOpenAI(
+        model=model_name,
+        temperature=0,
+        timeout=AGENT_LLM_TIMEOUT,
+        max_retries=AGENT_LLM_MAX_RETRIES,
+        extra_body={"prompt_cache_key": "budget-planner-agent"},
+    )
+    return llm.bind_tools(tools)
+
+SYSTEM_PROMPT = """You are a specialized Budget Assistant.
     Your SOLE purpose is to help users analyze their financial data from the provided CSV and assist with budget planning.
 
     RULES:
-    1. You have access to a tool `analyze_finances` that can execute Python code on a pandas DataFrame `df`.
-    2. The DataFrame `df` has columns: Date, Description, Amount, Category.
-    3. When specific numbers, calculations, or data summaries are needed for budget planning, YOU MUST write Python code to calculate them using the tool. DO NOT calculate in your head or hallucinate numbers.
+    1. You have two tools:
+       - `query_finances` runs a prebuilt aggregation (totals, per-category and per-month sums, top merchants, largest expenses, counts) with optional category and date filters. Use it whenever it can answer the question.
+       - `analyze_finances` executes Python code on a pandas DataFrame `df`. Use it for anything query_finances cannot do.
+    2. The DataFrame `df` has columns: Date (datetime), Description (string), Amount (float), Category (categorical; pass observed=True to groupby).
+       Two pre-filtered frames with the same columns are also available: `expenses` (only spending rows, Amount already a POSITIVE value) and `income` (only rows with Amount > 0). Prefer them over filtering `df` yourself.
+       `monthly` holds expense totals (positive) with one row per month (index 'YYYY-MM') and one column per Category; use it for per-month and average-monthly questions instead of grouping by date.
+    3. When specific numbers, calculations, or data summaries are needed for budget planning, YOU MUST calculate them with the tools (query_finances, or Python code via analyze_finances). DO NOT calculate in your head or hallucinate numbers.
     4. You should proactively help with budget planning by analyzing spending patterns (e.g., average monthly spending per category) using the tool.
     5. If the user asks about something completely unrelated to the budget, expenses, or financial/budget planning based on this data, politely inform them of your purpose. For example, "I specialize in helping you manage your budget and expenses. How can I help with your finances today?"
     6. Your FINAL answer to the user must be in natural language. DO NOT include the code, the verification steps, or technical jargon in the final response. Just the answer.
@@ -86,9 +317,9 @@ def chatbot(state: State):
 
     IMPORTANT - INCOME vs EXPENSES:
     9.  **Positive amounts** (Amount > 0) are INCOME (e.g., salary, refunds, credits, transfers INTO account).
-    10. **Negative amounts** (Amount < 0) are EXPENSES (money spent). When reporting expenses, always display them as POSITIVE values (multiply by -1 or use abs()).
+    10. **Negative amounts** (Amount < 0) are EXPENSES (money spent). When reporting expenses, always display them as POSITIVE values (the `expenses` frame already does this).
     11. Common income categories: Transfer, Income, Salary, Refund, Credit, Deposit.
-    12. When showing expense breakdowns by category, filter for negative amounts only (Amount < 0), then display as positive.
+    12. When showing expense breakdowns by category, use the `expenses` frame (negative amounts only, already positive).
 
     ══════════════════════════════════════════════
     CORE BUDGET PLANNING LOGIC  (80 % Rule)
@@ -96,14 +327,14 @@ def chatbot(state: State):
     Whenever the user asks about budget planning, forecasting, or how much they should spend, apply the following logic:
 
     STEP 1 – Calculate total income:
-        income = df[df['Amount'] > 0]['Amount'].sum()
+        total_income = income['Amount'].sum()
 
     STEP 2 – Set the TARGET BUDGET to 80 % of income:
-        target_budget = income * 0.80
+        target_budget = total_income * 0.80
         (The remaining 20 % is reserved for savings / emergencies.)
 
     STEP 3 – Calculate total expenses (positive value):
-        total_expenses = abs(df[df['Amount'] < 0]['Amount'].sum())
+        total_expenses = expenses['Amount'].sum()
 
     STEP 4 – Compare and decide:
         • If total_expenses > target_budget  →  OVER BUDGET
@@ -124,22 +355,25 @@ def chatbot(state: State):
         • Action items (cuts to make, or how to use the surplus)
 
     Examples:
-    User: "How much did I spend on Food?"
-    Tool Call: analyze_finances("result = abs(df[df['Category'] == 'Food']['Amount'].sum())")
+    User: "How much did I spend on food?"
+    Tool Call: query_finances(op="total_expenses", category="Food & Dining")
     Tool Output: 330.5
-    Assistant: "You spent a total of $330.50 on Food."
+    Assistant: "You spent a total of $330.50 on Food & Dining."
+
+    User: "What's my average monthly spending per category?"
+    Tool Call: analyze_finances("result = monthly.mean().round(2).sort_values(ascending=False).to_dict()")
+    Tool Output: {Food & Dining: 410.25, Travel: 120.5}
+    Assistant: "On average you spend $410.25 a month on Food & Dining and $120.50 on Travel."
 
     User: "Help me plan a budget for next month." or "What's my budget?"
     Tool Call:
         analyze_finances(\"\"\"
-income = df[df['Amount'] > 0]['Amount'].sum()
-target = income * 0.80
-expenses_only = df[df['Amount'] < 0].copy()
-expenses_only['Amount'] = expenses_only['Amount'].abs()
-total_exp = expenses_only['Amount'].sum()
-by_category = expenses_only.groupby('Category')['Amount'].sum().sort_values(ascending=False).to_dict()
+total_income = income['Amount'].sum()
+target = total_income * 0.80
+total_exp = expenses['Amount'].sum()
+by_category = expenses.groupby('Category', observed=True)['Amount'].sum().sort_values(ascending=False).to_dict()
 result = {
-    'income': round(income, 2),
+    'income': round(total_income, 2),
     'target_budget': round(target, 2),
     'total_expenses': round(total_exp, 2),
     'over_budget': total_exp > target,
@@ -147,27 +381,47 @@ result = {
     'by_category': by_category
 }
 \"\"\")
-    Tool Output: {income: 5000, target_budget: 4000, total_expenses: 4500, over_budget: True, gap_or_headroom: 500, by_category: {Entertainment: 900, Food: 800, Shopping: 600, Transport: 200}}
+    Tool Output: {income: 5000, target_budget: 4000, total_expenses: 4500, over_budget: True, gap_or_headroom: 500, by_category: {Entertainment: 900, Food & Dining: 800, Retail: 600, Travel: 200}}
     Assistant: "Your total income is $5,000.00. Your 80% target budget is $4,000.00, but your current expenses are $4,500.00 — you are $500.00 over budget.
     Here are the top areas to cut:
     • Entertainment ($900.00) — consider reducing subscriptions or outings.
-    • Food ($800.00) — try cooking at home more often.
-    • Shopping ($600.00) — postpone non-essential purchases.
+    • Food & Dining ($800.00) — try cooking at home more often.
+    • Retail ($600.00) — postpone non-essential purchases.
     Reducing spending in these categories would bring you back within your target budget."
 
-    Tool Output: {income: 5000, target_budget: 4000, total_expenses: 3500, over_budget: False, gap_or_headroom: 500, by_category: {Food: 800, Transport: 200}}
+    Tool Output: {income: 5000, target_budget: 4000, total_expenses: 3500, over_budget: False, gap_or_headroom: 500, by_category: {Food & Dining: 800, Travel: 200}}
     Assistant: "Great news! Your total income is $5,000.00 and your 80% target budget is $4,000.00. Your current expenses of $3,500.00 are well within that limit — you have $500.00 of budget headroom remaining. Consider saving or investing that surplus."
     """
-    
-    messages = [SystemMessage(content=system_prompt)] + state["messages"]
-    return {"messages": [llm_with_tools.invoke(messages)]}
 
-def tool_executor(state: State):
+# Built once: the prompt is identical on every turn, which also keeps it a stable cacheable prefix
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+async def chatbot(state: State):
+    llm_with_tools = _get_llm(os.getenv("OPENAI_MODEL", "gpt-4o-mini")) # Using model from env
+    messages = [SYSTEM_MESSAGE, *state["messages"]]
+    return {"messages": [await llm_with_tools.ainvoke(messages)]}
+
+async def _call_tool(tool_call: dict):
+    tool = TOOLS_BY_NAME.get(tool_call["name"])
+    if tool is None:
+        # Every tool call id needs an answer, or the next model request is rejected
+        raise ValueError(f"Unknown tool '{tool_call['name']}'. Available tools: {', '.join(TOOLS_BY_NAME)}")
+    return await tool.ainvoke(tool_call["args"])
+
+async def tool_executor(state: State):
     tool_calls = state["messages"][-1].tool_calls
+    # Run independent calls from one turn concurrently; sync tools are run in the
+    # default executor and analyze_finances moves its exec to a thread itself.
+    # A failing call (e.g. arguments that do not validate) is reported back to the
+    # model as its own error result instead of failing the whole turn
+    outputs = await asyncio.gather(*(_call_tool(t) for t in tool_calls), return_exceptions=True)
     results = []
-    for t in tool_calls:
-        if t["name"] == "analyze_finances":
-            output = analyze_finances.invoke(t)
+    for t, output in zip(tool_calls, outputs):
+        if isinstance(output, Exception):
+            results.append(ToolMessage(tool_call_id=t["id"], name=t["name"], content=f"Error: {output}", status="error"))
+        elif isinstance(output, BaseException):
+            raise output
+        else:
             results.append(ToolMessage(tool_call_id=t["id"], name=t["name"], content=output))
     return {"messages": results}
 
@@ -175,7 +429,7 @@ def should_continue(state: State) -> Literal["tools", END]:
     messages = state["messages"]
     last_message = messages[-1]
     # Check if the last message is an AI message and has tool calls
-    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
+    if isinstance(last_message, AIMessage) and last_message.tool_calls:
         return "tools"
     return END
 
@@ -190,23 +444,125 @@ graph_builder.add_edge("tools", "chatbot")
 
 graph = graph_builder.compile()
 
-async def run_agent(user_input: str, history: list = None):
+# Questions simple enough to answer straight from query_finances, skipping both
+# LLM round trips; anything that does not match goes through the graph
+_FAST_PATHS = [
+    (re.compile(r"how much (?:did i spend|have i spent)(?: in total| overall)?"), "total_expenses", "You spent {amount} in total."),
+    (re.compile(r"how much (?:did i spend|have i spent) on (?P<category>[a-z][a-z &-]*)"), "total_expenses", "You spent {amount} on {category}."),
+    (re.compile(r"what(?: is| was|'s) my (?:total )?income"), "total_income", "Your total income is {amount}."),
+]
+
+def _fast_answer(user_input: str):
+    """Answer a templated numeric question directly, or return None to use the full agent."""
+    question = user_input.strip().lower().replace("’", "'").rstrip("?.! ")
+    for pattern, op, template in _FAST_PATHS:
+        match = pattern.fullmatch(question)
+        if not match:
+            continue
+        category = match.groupdict().get("category")
+        if category:
+            reload_transactions()
+            known = {str(c).lower(): str(c) for c in _CACHE["expenses"]["Category"].unique()}
+            # Unknown names may be merchants or free-form; leave those to the model
+            if category.strip() not in known:
+                return None
+            category = known[category.strip()]
+        try:
+            amount = float(_query(op, category))
+        except Exception as e:
+            logger.warning(f"Fast path failed, falling back to the agent: {e}")
+            return None
+        return template.format(amount=f"${amount:,.2f}", category=category)
+    return None
+
+# Words in earlier user turns that suggest the conversation was narrowed to a period,
+# a subset or an exclusion; an unqualified follow-up then has to go to the model
+_SCOPE_WORDS = re.compile(
+    r"\b(?:only|just|except|excluding|without|since|before|after|between|from|during|until"
+    r"|last|this|past|previous|next|today|yesterday|week|month|year|quarter"
+    r"|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|\d{4})\b"
+)
+
+def _history_narrows_scope(history: list) -> bool:
+    """True if an earlier user turn may have scoped the conversation (history is (role, text) pairs)."""
+    return any(role == "user" and _SCOPE_WORDS.search(str(text).lower()) for role, text in history)
+
+async def _fast_path(user_input: str, history: list):
+    """
+    Fast-path answer, or None to run the graph.
+    
+    Skipped when the history may have narrowed the scope, since the templates
+    always answer over all transactions. Runs in a thread because it may load
+    the Parquet store.
+    """
+    if _history_narrows_scope(history):
+        return None
+    return await asyncio.to_thread(_fast_answer, user_input)
+
+async def run_agent(user_input: str, history: Optional[list] = None):
     """
     Adapter to run the graph with a simple string input.
     """
     if history is None:
         history = []
     
+    fast_response = await _fast_path(user_input, history)
+    if fast_response is not None:
+        return fast_response
+    
     inputs = {"messages": history + [("user", user_input)]}
+    _start_prefetch()
+    
+    # Only the final answer is needed, so run to completion rather than streaming each step
+    final_state = await graph.ainvoke(inputs)
+    last_msg = final_state["messages"][-1]
+    # The graph ends on an AI message without tool calls
+    if isinstance(last_msg, AIMessage) and not last_msg.tool_calls:
+        return last_msg.content
+    return ""
+
+async def run_agent_stream(user_input: str, history: Optional[list] = None) -> AsyncIterator[str]:
+    """
+    Run the graph and yield the assistant's answer as text deltas while the model generates it.
+    
+    Text the model sends along with tool calls (e.g. "Let me check.") is streamed as it
+    arrives and cannot be taken back, so it is kept apart from the next step's text by a newline.
+    """
+    if history is None:
+        history = []
     
-    # helper to get just the final response text
-    final_response = ""
-    async for event in graph.astream(inputs, stream_mode="values"):
-        if "messages" in event:
-            last_msg = event["messages"][-1]
-            # Check if it is an AI message (assistant) and has no tool calls
-            if last_msg.type == "ai":
-                if not (hasattr(last_msg, "tool_calls") and last_msg.tool_calls):
-                    final_response = last_msg.content
+    fast_response = await _fast_path(user_input, history)
+    if fast_response is not None:
+        yield fast_response
+        return
     
-    return final_response
+    inputs = {"messages": history + [("user", user_input)]}
+    _start_prefetch()
+    
+    spoken_step = None
+    async for message, metadata in graph.astream(inputs, stream_mode="messages"):
+        # Only model tokens from the chatbot node; tool-call chunks carry no text
+        if metadata.get("langgraph_node") != "chatbot" or not isinstance(message, AIMessageChunk):
+            continue
+        if message.content:
+            step = metadata.get("langgraph_step")
+            if spoken_step is not None and step != spoken_step:
+                yield "\n"
+            spoken_step = step
+            yield message.content
+
+def _warmup():
+    """
+    Exercise the tool paths once so the first user question does not pay for
+    first-call imports and parsing inside pandas/pyarrow.
+    """
+    try:
+        _execute_code("result = len(df)")
+        _prefetch_common_aggregates()
+    except Exception as e:
+        logger.warning(f"Warmup failed: {e}")
+
+# Set WARMUP=0 to skip (e.g. for scripts that only import this module); empty means on
+if os.getenv("WARMUP", "1") != "0":
+    _warmup()
@@ -1,11 +1,29 @@
+import asyncio
 import logging
+import time
 from typing import Any, AsyncIterable
 from livekit.agents import llm, utils
 from livekit.agents.types import APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS
-from .graph import run_agent
+from .graph import run_agent_stream
 
 logger = logging.getLogger("graph_llm")
 
+# Deadline for the first token of one attempt at a turn; a turn still silent at the
+# deadline is restarted once, so the caller hears either an answer or the apology
+# within TURN_ATTEMPTS * FIRST_TOKEN_TIMEOUT (30 s). The budgets do not nest: a
+# tool-using turn makes at least two model calls plus a tool run of up to
+# EXEC_TIMEOUT, and AGENT_LLM_TIMEOUT x (AGENT_LLM_MAX_RETRIES + 1) per call is longer
+# than one attempt. The client's retries handle a request that fails or stalls once
+# (8 s plus a normal retry fits); a turn that is slower overall is cut here and
+# restarted rather than left to run through every client retry in silence. Once the
+# answer is speaking there is no deadline, since it cannot be restarted
+FIRST_TOKEN_TIMEOUT = 15.0
+TURN_ATTEMPTS = 2
+
+# Outgoing tokens are batched into one ChatChunk per phrase or per interval
+FLUSH_INTERVAL = 0.05
+FLUSH_PUNCTUATION = frozenset(".!?,;:")
+
 class GraphLLMStream(llm.LLMStream):
     def __init__(self, llm: llm.LLM, chat_ctx: llm.ChatContext, tools: list[llm.Tool] | None = None, conn_options: APIConnectOptions | None = None):
         super().__init__(llm=llm, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options or DEFAULT_API_CONNECT_OPTIONS)
@@ -14,46 +32,42 @@ class GraphLLMStream(llm.LLMStream):
     async def _run(self) -> None:
         # Extract messages
         logger.info("Preparing to run graph with message history")
-        messages = []
-        for msg in self._chat_ctx.messages():
-            if msg.role == "user":
-                messages.append(("user", msg.text_content or ""))
-            elif msg.role == "assistant":
-                messages.append(("assistant", msg.text_content or ""))
-            # System messages are handled by the graph itself
-        
-        user_input = ""
-        history = []
-        
-        if messages:
-            if messages[-1][0] == "user":
-                user_input = messages[-1][1]
-                history = messages[:-1]
-            else:
-                # If the last message wasn't user, we might be in a weird state or just starting
-                # But typically LLM is called after user input.
-                # For now, assume strict turn-taking.
-                history = messages
+        # System messages are handled by the graph itself
+        turns = [msg for msg in self._chat_ctx.messages() if msg.role in ("user", "assistant")]
+        if not turns:
+            return
         
+        # Assume strict turn-taking: the LLM is called right after user input
+        last = turns[-1]
+        user_input = (last.text_content or "") if last.role == "user" else ""
         if not user_input:
-             # If called without input, maybe just return empty or generic greeting?
-             if not history:
-                 return
-             
-             logger.warning("No user input found in chat context")
-             return
+            logger.warning("No user input found in chat context")
+            return
+        
+        history = [(msg.role, msg.text_content or "") for msg in turns[:-1]]
 
         try:
             logger.info(f"Running graph for input: {user_input}")
-            response_text = await run_agent(user_input, history)
-            logger.info(f"Graph returned: {response_text}")
+            chunk_id = utils.shortuuid("chunk_")
+            for attempt in range(1, TURN_ATTEMPTS + 1):
+                response_parts = []
+                try:
+                    await self._stream_answer(user_input, history, chunk_id, response_parts)
+                    break
+                except asyncio.TimeoutError:
+                    # A partly spoken answer cannot be taken back, so only retry a silent turn
+                    if response_parts or attempt == TURN_ATTEMPTS:
+                        raise
+                    logger.warning(f"Graph produced no output in {FIRST_TOKEN_TIMEOUT:g}s, retrying ({attempt}/{TURN_ATTEMPTS})")
+            logger.info(f"Graph returned: {''.join(response_parts)}")
             
+        except asyncio.TimeoutError:
+            logger.error(f"Graph produced no output in {FIRST_TOKEN_TIMEOUT:g}s")
             chunk = llm.ChatChunk(
                 id=utils.shortuuid("chunk_"),
-                delta=llm.ChoiceDelta(content=response_text, role="assistant")
+                delta=llm.ChoiceDelta(content="Sorry, that took too long. Please try asking again.", role="assistant")
             )
             await self._event_ch.send(chunk)
-            
         except Exception as e:
             logger.error(f"Error running graph: {e}")
             chunk = llm.ChatChunk(
@@ -62,6 +76,68 @@ class GraphLLMStream(llm.LLMStream):
             )
             await self._event_ch.send(chunk)
 
+    async def _stream_answer(self, user_input: str, history: list, chunk_id: str, response_parts: list) -> None:
+        """
+        Forward answer tokens as they arrive so TTS can start before the answer is complete.
+        
+        The first token is sent at once; after that tokens are coalesced and sent at
+        punctuation or once they have waited FLUSH_INTERVAL seconds, rather than one
+        chunk per token. Buffered text is also sent when the next token is late (e.g.
+        while a tool runs), so it is never held back waiting for more.
+        Raises asyncio.TimeoutError if no token arrives within FIRST_TOKEN_TIMEOUT.
+        """
+        buffer = []
+        last_flush = 0.0
+        
+        async def flush():
+            nonlocal last_flush
+            chunk = llm.ChatChunk(
+                id=chunk_id,
+                delta=llm.ChoiceDelta(content="".join(buffer), role="assistant")
+            )
+            buffer.clear()
+            last_flush = time.monotonic()
+            await self._event_ch.send(chunk)
+        
+        stream = run_agent_stream(user_input, history)
+        next_delta = asyncio.ensure_future(anext(stream))
+        try:
+            done, _ = await asyncio.wait({next_delta}, timeout=FIRST_TOKEN_TIMEOUT)
+            if not done:
+                raise asyncio.TimeoutError
+            while True:
+                if buffer and not next_delta.done():
+                    # Send the buffer if the next token has not arrived by the end of the interval
+                    wait = FLUSH_INTERVAL - (time.monotonic() - last_flush)
+                    done, _ = await asyncio.wait({next_delta}, timeout=max(wait, 0.0))
+                    if not done:
+                        await flush()
+                await asyncio.wait({next_delta})
+                try:
+                    delta = next_delta.result()
+                except StopAsyncIteration:
+                    break
+                next_delta = asyncio.ensure_future(anext(stream))
+                # A phrase ends at punctuation followed by whitespace, so "$1,446.39" stays whole
+                if buffer and delta[:1].isspace() and buffer[-1][-1:] in FLUSH_PUNCTUATION:
+                    await flush()
+                response_parts.append(delta)
+                buffer.append(delta)
+                if (
+                    len(response_parts) == 1
+                    or "\n" in delta
+                    or time.monotonic() - last_flush >= FLUSH_INTERVAL
+                ):
+                    await flush()
+            if buffer:
+                await flush()
+        finally:
+            # The generator cannot be closed while the pending read is still running in it
+            if not next_delta.done():
+                next_delta.cancel()
+                await asyncio.wait({next_delta})
+            await stream.aclose()
+
 class GraphLLM(llm.LLM):
     def __init__(self):
         super().__init__()
@@ -0,0 +1,4 @@
+import os
+
+# Importing graph would otherwise warm up against the real data directory
+os.environ.setdefault("WARMUP", "0")
@@ -0,0 +1,234 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+
+import csv_parser
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_transactions.csv")
+
+DEBIT_CREDIT_MAPPING = {
+    "date_column": "Date",
+    "date_format": "%Y-%m-%d",
+    "description_column": "Description",
+    "amount_columns": {"type": "debit_credit", "debit": "Debit", "credit": "Credit", "single": None, "invert_sign": False},
+}
+
+
+def _single_mapping(date_format: str = "%d/%m/%Y", invert_sign: bool = False) -> dict:
+    return {
+        "date_column": "Posted",
+        "date_format": date_format,
+        "description_column": "Payee",
+        "amount_columns": {"type": "single", "debit": None, "credit": None, "single": "Amount", "invert_sign": invert_sign},
+    }
+
+
+class StubLLM:
+    """Stands in for _chat_json: returns a fixed column mapping and categorizes merchants by keyword."""
+
+    def __init__(self, mapping: dict):
+        self.mapping = mapping
+        self.calls = []
+
+    def __call__(self, client, system, prompt, schema_name, schema):
+        self.calls.append(schema_name)
+        if schema_name == "column_mapping":
+            return {"column_mapping": self.mapping}
+        merchants = json.loads(prompt.split("\n", 1)[1])
+        return {
+            "categories": [
+                {"merchant": m, "category": "Income" if "salary" in m else "Groceries" if "foods" in m else "Other"}
+                for m in merchants
+            ]
+        }
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Keep the parse and merchant caches out of the real data directory."""
+    monkeypatch.setattr(csv_parser, "LLM_CACHE_DIR", str(tmp_path / "llm_cache"))
+    monkeypatch.setattr(csv_parser, "MERCHANT_CACHE_PATH", str(tmp_path / "merchant_cache.json"))
+    monkeypatch.setattr(csv_parser, "_parse_cache", OrderedDict())
+    monkeypatch.setattr(csv_parser, "_get_client", lambda: None)
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    def install(mapping: dict) -> StubLLM:
+        stub = StubLLM(mapping)
+        monkeypatch.setattr(csv_parser, "_chat_json", stub)
+        return stub
+
+    return install
+
+
+def _write(tmp_path, name: str, text: str, bom: bool = False) -> str:
+    path = tmp_path / name
+    path.write_bytes((b"\xef\xbb\xbf" if bom else b"") + text.encode("utf-8"))
+    return str(path)
+
+
+def test_debit_credit_amounts(stub_llm) -> None:
+    """Debits become negative and credits positive."""
+    stub_llm(DEBIT_CREDIT_MAPPING)
+    df = csv_parser.parse_csv_with_llm(SAMPLE_CSV)
+    assert list(df.columns) == ["Date", "Description", "Amount", "Category"]
+    first = df.iloc[0]
+    assert (first["Date"], first["Description"], first["Amount"]) == ("2024-02-01", "Whole Foods Market", -85.5)
+    salary = df[df["Description"] == "Salary Deposit"].iloc[0]
+    assert salary["Amount"] == 3500.0
+    assert salary["Category"] == "Income"
+
+
+def test_single_amount_column_with_accounting_negatives(tmp_path, stub_llm) -> None:
+    """Currency symbols, thousands separators and (parentheses) are understood."""
+    stub_llm(_single_mapping())
+    path = _write(tmp_path, "single.csv", 'Posted,Payee,Amount\n05/01/2024,Whole Foods,(85.50)\n31/01/2024,Salary,"$1,200.00"\n')
+    df = csv_parser.parse_csv_with_llm(path)
+    assert df["Date"].tolist() == ["2024-01-05", "2024-01-31"]
+    assert df["Amount"].tolist() == [-85.5, 1200.0]
+
+
+def test_invert_sign(tmp_path, stub_llm) -> None:
+    """Statements that list spending as positive numbers are flipped."""
+    stub_llm(_single_mapping(date_format="%Y/%m/%d", invert_sign=True))
+    path = _write(tmp_path, "card.csv", "Posted,Payee,Amount\n2024/03/02,Whole Foods,42.10\n2024/03/09,Refund,-5.00\n")
+    df = csv_parser.parse_csv_with_llm(path)
+    assert df["Date"].tolist() == ["2024-03-02", "2024-03-09"]
+    assert df["Amount"].tolist() == [-42.1, 5.0]
+
+
+def test_unparseable_dates_are_left_empty(tmp_path, stub_llm, caplog) -> None:
+    """Rows that do not match the date format keep no date, and the miss is logged."""
+    stub_llm(_single_mapping(date_format="%d/%m/%Y"))
+    path = _write(tmp_path, "mixed.csv", "Posted,Payee,Amount\n05/01/2024,Shop,-1\n2024-01-06,Shop,-2\n")
+    df = csv_parser.parse_csv_with_llm(path)
+    assert df["Date"].isna().tolist() == [False, True]
+    assert "1 of 2 rows have no parseable date" in caplog.text
+
+
+@pytest.mark.parametrize("ragged", [False, True])
+def test_numeric_descriptions_stay_text(tmp_path, stub_llm, ragged) -> None:
+    """Check numbers keep leading zeros with either CSV engine, and blanks stay empty."""
+    stub_llm(_single_mapping())
+    extra = ",x" if ragged else ""  # a ragged row makes pyarrow give up and the C engine take over
+    path = _write(tmp_path, "checks.csv", f"Posted,Payee,Amount\n05/01/2024,00123,-1{extra}\n06/01/2024,,-2\n")
+    df = csv_parser.parse_csv_with_llm(path)
+    assert df["Description"].tolist() == ["00123", ""]
+
+
+def test_byte_order_mark_is_ignored(tmp_path, stub_llm) -> None:
+    """A UTF-8 BOM does not become part of the first column name."""
+    with open(SAMPLE_CSV, encoding="utf-8") as f:
+        path = _write(tmp_path, "bom.csv", f.read(), bom=True)
+    header, _ = csv_parser._read_header_and_samples(path)
+    assert header[0] == "Date"
+
+    stub_llm(DEBIT_CREDIT_MAPPING)
+    assert len(csv_parser.parse_csv_with_llm(path)) == len(pd.read_csv(SAMPLE_CSV))
+
+
+def test_merchant_cache_skips_categorization_call(tmp_path, stub_llm) -> None:
+    """Merchants seen in an earlier upload are categorized from the cache."""
+    stub = stub_llm(_single_mapping())
+    first = _write(tmp_path, "jan.csv", "Posted,Payee,Amount\n05/01/2024,WHOLE FOODS 1234,-10\n")
+    second = _write(tmp_path, "feb.csv", "Posted,Payee,Amount\n05/02/2024,Whole Foods  987,-20\n")
+
+    csv_parser.parse_csv_with_llm(first)
+    assert stub.calls == ["column_mapping", "merchant_categories"]
+
+    stub.calls.clear()
+    df = csv_parser.parse_csv_with_llm(second)
+    assert stub.calls == ["column_mapping"]
+    assert df["Category"].tolist() == ["Groceries"]
+
+
+def test_merchants_are_categorized_in_batches(tmp_path, stub_llm, monkeypatch) -> None:
+    """Large merchant lists are split; a failed batch and renamed merchants fall back to 'Other' uncached."""
+    monkeypatch.setattr(csv_parser, "CATEGORIZE_BATCH_SIZE", 2)
+    stub = stub_llm(_single_mapping())
+    categorize = StubLLM.__call__
+
+    def flaky(client, system, prompt, schema_name, schema):
+        if "broken" in prompt:
+            stub.calls.append(schema_name)
+            raise ValueError("truncated JSON")
+        result = categorize(stub, client, system, prompt, schema_name, schema)
+        for item in result.get("categories", []):
+            item["merchant"] = item["merchant"].replace("acme", "acme inc")
+        return result
+
+    monkeypatch.setattr(csv_parser, "_chat_json", flaky)
+    rows = ["Whole Foods", "Salary", "Acme", "Broken Shop", "Kiosk"]
+    path = _write(tmp_path, "many.csv", "Posted,Payee,Amount\n" + "".join(f"05/01/2024,{r},-1\n" for r in rows))
+    df = csv_parser.parse_csv_with_llm(path)
+
+    assert stub.calls.count("merchant_categories") == 3
+    assert dict(zip(df["Description"], df["Category"])) == {
+        "Whole Foods": "Groceries", "Salary": "Income", "Acme": "Other", "Broken Shop": "Other", "Kiosk": "Other",
+    }
+    assert sorted(csv_parser._load_merchant_cache()) == ["kiosk", "salary", "whole foods"]
+
+
+def test_parse_cache_reuses_results_for_identical_content(tmp_path, stub_llm, monkeypatch) -> None:
+    """Re-uploading the same bytes skips the LLM, from memory and then from the Parquet cache."""
+    stub = stub_llm(DEBIT_CREDIT_MAPPING)
+    expected = csv_parser.parse_csv_with_llm(SAMPLE_CSV)
+    stub.calls.clear()
+
+    with open(SAMPLE_CSV, encoding="utf-8") as f:
+        copy = _write(tmp_path, "copy.csv", f.read())
+    pd.testing.assert_frame_equal(csv_parser.parse_csv_with_llm(copy), expected)
+
+    monkeypatch.setattr(csv_parser, "_parse_cache", OrderedDict())
+    cached = csv_parser.parse_csv_with_llm(copy)
+    assert stub.calls == []
+    pd.testing.assert_frame_equal(cached.astype({"Category": str}), expected.astype({"Category": str}))
+
+
+def test_parse_cache_directory_is_bounded(tmp_path, stub_llm, monkeypatch) -> None:
+    """Only the most recently used parses are kept on disk."""
+    monkeypatch.setattr(csv_parser, "MAX_CACHED_PARSE_FILES", 2)
+    stub_llm(_single_mapping())
+    paths = [_write(tmp_path, f"{i}.csv", f"Posted,Payee,Amount\n05/01/2024,Shop,-{i}\n") for i in range(3)]
+    keys = [csv_parser._file_digest(p) for p in paths]
+
+    for age, i in ((20, 0), (10, 1)):
+        csv_parser.parse_csv_with_llm(paths[i])
+        cached = os.path.join(csv_parser.LLM_CACHE_DIR, f"{keys[i]}.parquet")
+        os.utime(cached, (time.time() - age, time.time() - age))
+    # A hit on disk counts as a use, so the older first parse outlives the second
+    monkeypatch.setattr(csv_parser, "_parse_cache", OrderedDict())
+    csv_parser.parse_csv_with_llm(paths[0])
+    csv_parser.parse_csv_with_llm(paths[2])
+
+    assert sorted(os.listdir(csv_parser.LLM_CACHE_DIR)) == sorted(f"{keys[i]}.parquet" for i in (0, 2))
+
+
+@pytest.mark.parametrize(
+    ("values", "expected"),
+    [
+        (["$1,234.56", "(85.50)", "85.50-", "-12", "$ (1,000.00)"], [1234.56, -85.5, -85.5, -12.0, -1000.0]),
+        (["1.234,56", "12,50", "-3,00"], [1234.56, 12.5, -3.0]),
+        (["1,234", "n/a", None], [1234.0, None, None]),
+    ],
+)
+def test_to_number(values, expected) -> None:
+    """Amount strings are converted the way banks write them."""
+    result = csv_parser._to_number(pd.Series(values, dtype=object))
+    assert [None if pd.isna(v) else v for v in result.tolist()] == expected
+
+
+def test_merchant_keys_and_mapped_columns() -> None:
+    """Merchant stems drop digits and case; mapped columns are listed once each."""
+    keys = csv_parser._merchant_keys(pd.Series(["UBER  *TRIP 1234", "Uber *Trip 99"]))
+    assert keys.tolist() == ["uber *trip", "uber *trip"]
+
+    mapping = _single_mapping()
+    mapping["description_column"] = mapping["date_column"]
+    assert csv_parser._mapped_columns(mapping) == ["Posted", "Amount"]
+    assert csv_parser._mapped_columns(DEBIT_CREDIT_MAPPING) == ["Date", "Description", "Debit", "Credit"]
@@ -0,0 +1,297 @@
+import ast
+import json
+import re
+
+import pandas as pd
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import graph
+from csv_parser import save_transactions
+
+TRANSACTIONS = pd.DataFrame(
+    {
+        "Date": ["2024-01-05", "2024-01-20", "2024-01-31", "2024-02-03", "2024-02-10", "2024-02-15"],
+        "Description": ["Whole Foods", "Uber", "Salary", "Whole Foods", "Netflix", "Refund"],
+        "Amount": [-50.0, -20.0, 3000.0, -30.5, -15.0, 10.0],
+        "Category": ["Groceries", "Travel", "Income", "Groceries", "Subscription", "Groceries"],
+    }
+)
+
+
+@pytest.fixture
+def transactions_path(tmp_path, monkeypatch) -> str:
+    """Point the agent at a small Parquet store written the same way the web app writes it."""
+    path = str(tmp_path / "transactions.parquet")
+    save_transactions(TRANSACTIONS, path)
+    monkeypatch.setattr(graph, "TRANSACTIONS_PATH", path)
+    return path
+
+
+def _query(**kwargs):
+    return ast.literal_eval(graph.query_finances.invoke(kwargs))
+
+
+@pytest.mark.parametrize(
+    ("op", "expected"),
+    [
+        ("total_expenses", 115.5),
+        ("total_income", 3010.0),
+        ("sum_by_category", {"Groceries": 80.5, "Travel": 20.0, "Subscription": 15.0}),
+        ("monthly_expenses", {"2024-01": 70.0, "2024-02": 45.5}),
+        ("transaction_count", {"expenses": 4, "income": 2}),
+    ],
+)
+def test_query_finances_ops(transactions_path, op, expected) -> None:
+    """Each prebuilt op aggregates expenses as positive values."""
+    assert _query(op=op) == expected
+
+
+def test_query_finances_row_limited_ops(transactions_path) -> None:
+    """n limits the rows of top_merchants and largest_expenses."""
+    assert _query(op="top_merchants", n=1) == {"Whole Foods": 80.5}
+    assert _query(op="largest_expenses", n=2) == [
+        {"Date": "2024-01-05", "Description": "Whole Foods", "Amount": 50.0, "Category": "Groceries"},
+        {"Date": "2024-02-03", "Description": "Whole Foods", "Amount": 30.5, "Category": "Groceries"},
+    ]
+
+
+def test_query_finances_filters(transactions_path) -> None:
+    """Category matches case-insensitively; start and end are inclusive."""
+    assert _query(op="total_expenses", category="groceries") == 80.5
+    assert _query(op="total_income", category="Groceries") == 10.0
+    assert _query(op="total_expenses", start="2024-02-01") == 45.5
+    assert _query(op="total_expenses", end="2024-01-20") == 70.0
+    assert _query(op="total_expenses", start="2024-01-20", end="2024-02-03") == 50.5
+    assert _query(op="total_expenses", category="Travel", start="2024-02-01") == 0.0
+
+
+def test_query_finances_reports_bad_input(transactions_path) -> None:
+    """Unknown ops and unparseable dates come back as messages, not exceptions."""
+    assert graph.query_finances.invoke({"op": "average"}).startswith("Unknown op 'average'")
+    assert graph.query_finances.invoke({"op": "total_expenses", "start": "soon"}).startswith(
+        "Error running query:"
+    )
+
+
+def test_query_finances_accepts_explicit_nulls(transactions_path) -> None:
+    """The model may send null for filters it does not use."""
+    assert _query(op="total_expenses", category=None, start=None, end=None) == 115.5
+
+
+def test_query_finances_rejects_unknown_category(transactions_path) -> None:
+    """A category missing from the data is reported with the ones that exist, not as 0."""
+    message = graph.query_finances.invoke({"op": "total_expenses", "category": "Food"})
+    assert message == "Unknown category 'Food'. Available categories: Groceries, Income, Subscription, Travel"
+
+
+async def _analyze(code: str) -> str:
+    return await graph.analyze_finances.ainvoke({"code": code})
+
+
+async def test_analyze_finances_runs_code_on_typed_frames(transactions_path) -> None:
+    """Code sees df, expenses, income and monthly, and reports its result variable."""
+    assert await _analyze("result = round(expenses['Amount'].sum(), 2)") == "115.5"
+    assert await _analyze("result = monthly.loc['2024-02', 'Groceries']") == "30.5"
+    assert await _analyze("total = len(df)") == "No result variable set."
+
+
+async def test_analyze_finances_rejects_long_code(transactions_path) -> None:
+    code = "result = 1" + " " * graph.MAX_CODE_LENGTH
+    assert await _analyze(code) == f"Error executing code: code is longer than {graph.MAX_CODE_LENGTH} characters."
+
+
+async def test_analyze_finances_times_out(transactions_path, monkeypatch) -> None:
+    """Slow code stops blocking the turn after EXEC_TIMEOUT."""
+    monkeypatch.setattr(graph, "EXEC_TIMEOUT", 0.05)
+    assert await _analyze("result = sum(range(20_000_000))") == "Error executing code: timed out after 0.05 seconds."
+
+
+@pytest.mark.parametrize("code", ["import os", "result = open('/etc/passwd').read()", "result = __import__('os')"])
+async def test_analyze_finances_allows_only_safe_builtins(transactions_path, code) -> None:
+    """Imports and file access are not available to tool code."""
+    assert (await _analyze(code)).startswith("Error executing code:")
+
+
+async def test_analyze_finances_cannot_modify_cached_frames(transactions_path) -> None:
+    """Code works on copies, so later tool calls still see the original data."""
+    assert await _analyze("df['Amount'] = 0\nexpenses.drop(expenses.index, inplace=True)\nresult = int(df['Amount'].sum())") == "0"
+    assert graph._CACHE["df"]["Amount"].sum() == 2894.5
+    assert len(graph._CACHE["expenses"]) == 4
+    assert _query(op="total_expenses") == 115.5
+
+
+async def test_analyze_finances_reuses_results_per_file_version(transactions_path) -> None:
+    """Identical code is run once per file version; errors are not cached."""
+    code = "result = round(float(expenses['Amount'].max()), 2)"
+    graph._run_code.cache_clear()
+    assert await _analyze(code) == "50.0"
+    assert await _analyze(code) == "50.0"
+    assert graph._run_code.cache_info().hits == 1
+
+    save_transactions(TRANSACTIONS.assign(Amount=TRANSACTIONS["Amount"] * 2), transactions_path)
+    assert await _analyze(code) == "100.0"
+
+    misses = graph._run_code.cache_info().misses
+    assert (await _analyze("result = 1 / 0")).startswith("Error executing code:")
+    assert (await _analyze("result = 1 / 0")).startswith("Error executing code:")
+    assert graph._run_code.cache_info().misses == misses + 2
+
+
+def test_filter_frame_without_filters_returns_frame(transactions_path) -> None:
+    """No filters means the frame is used as is."""
+    graph.reload_transactions()
+    expenses = graph._CACHE["expenses"]
+    assert graph._filter_frame(expenses) is expenses
+
+
+def test_reload_transactions_reuses_frame_until_file_changes(transactions_path) -> None:
+    """The Parquet file is only re-read when its identity changes."""
+    first = graph.reload_transactions()
+    assert graph.reload_transactions() is first
+    assert first["Date"].dtype.kind == "M"
+    assert isinstance(first["Category"].dtype, pd.CategoricalDtype)
+
+    save_transactions(TRANSACTIONS.iloc[:2], transactions_path)
+    second = graph.reload_transactions()
+    assert second is not first
+    assert len(second) == 2
+
+
+def test_aggregate_cache_is_invalidated_when_file_changes(transactions_path) -> None:
+    """Cached query results belong to one file version."""
+    assert _query(op="total_expenses") == 115.5
+    old_key = graph._CACHE["key"]
+    assert any(key[0] == old_key for key in graph._AGG_CACHE)
+
+    save_transactions(TRANSACTIONS.assign(Amount=TRANSACTIONS["Amount"] * 2), transactions_path)
+    assert _query(op="total_expenses") == 231.0
+    assert all(key[0] != old_key for key in graph._AGG_CACHE)
+
+
+def test_missing_file_gives_empty_typed_frame(tmp_path, monkeypatch) -> None:
+    """Without an upload the tools see an empty frame with the usual columns."""
+    monkeypatch.setattr(graph, "TRANSACTIONS_PATH", str(tmp_path / "missing.parquet"))
+    df = graph.reload_transactions()
+    assert df.empty
+    assert list(df.columns) == ["Date", "Description", "Amount", "Category"]
+    assert _query(op="total_expenses") == 0.0
+
+
+@pytest.fixture
+def fast_path_transactions(transactions_path) -> str:
+    """Add a category whose name has a space and an ampersand."""
+    dining = pd.DataFrame({"Date": ["2024-02-20"], "Description": ["Diner"], "Amount": [-12.25], "Category": ["Food & Dining"]})
+    save_transactions(pd.concat([TRANSACTIONS, dining], ignore_index=True), transactions_path)
+    return transactions_path
+
+
+@pytest.mark.parametrize(
+    ("question", "expected"),
+    [
+        ("How much did I spend?", "You spent $127.75 in total."),
+        ("how much have i spent overall", "You spent $127.75 in total."),
+        ("How much did I spend in total!", "You spent $127.75 in total."),
+        ("How much did I spend on groceries?", "You spent $80.50 on Groceries."),
+        ("How much did I spend on food & dining?", "You spent $12.25 on Food & Dining."),
+        ("What’s my income?", "Your total income is $3,010.00."),
+        ("what was my total income", "Your total income is $3,010.00."),
+        # Unknown categories may be merchants; anything else qualified goes to the model
+        ("How much did I spend on coffee?", None),
+        ("How much did I spend on food and dining?", None),
+        ("How much did I spend on groceries in January?", None),
+        ("How much did I spend last month?", None),
+        ("What is my income this year?", None),
+        ("Break down my spending", None),
+    ],
+)
+def test_fast_answer(fast_path_transactions, question, expected) -> None:
+    """Only exact templated questions over known categories are answered without the model."""
+    assert graph._fast_answer(question) == expected
+
+
+@pytest.mark.parametrize(
+    ("history", "answered"),
+    [
+        ([], True),
+        ([("user", "Hi there"), ("assistant", "Hello! How can I help?")], True),
+        ([("assistant", "Here is last month's summary.")], True),
+        ([("user", "Only look at February")], False),
+        ([("user", "What did I spend in 2024?")], False),
+        ([("user", "Let's talk about last month")], False),
+    ],
+)
+async def test_fast_path_skipped_when_history_narrows_scope(transactions_path, history, answered) -> None:
+    """A follow-up in a conversation scoped to a period or subset is left to the model."""
+    answer = await graph._fast_path("How much did I spend?", history)
+    assert (answer == "You spent $115.50 in total.") if answered else answer is None
+
+
+async def test_tool_executor_reports_failed_calls_per_call(transactions_path) -> None:
+    """Invalid arguments and unknown tools become error results; the other calls still answer."""
+    calls = [
+        {"name": "query_finances", "args": {"op": "total_expenses"}, "id": "ok"},
+        {"name": "query_finances", "args": {"op": "top_merchants", "n": "five"}, "id": "bad_args"},
+        {"name": "forecast", "args": {}, "id": "unknown"},
+    ]
+    state = {"messages": [graph.AIMessage(content="", tool_calls=calls)]}
+    results = (await graph.tool_executor(state))["messages"]
+
+    assert [m.tool_call_id for m in results] == ["ok", "bad_args", "unknown"]
+    assert [m.status for m in results] == ["success", "error", "error"]
+    assert results[0].content == "115.5"
+    assert results[1].content.startswith("Error: ")
+    assert results[2].content == "Error: Unknown tool 'forecast'. Available tools: query_finances, analyze_finances"
+
+
+class ScriptedChat(BaseChatModel):
+    """Chat model that plays back scripted replies, streaming their text word by word."""
+
+    replies: list
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self.replies.pop(0))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self.replies.pop(0)
+        for word in re.findall(r"\S+\s*", reply.content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        tool_call_chunks = [
+            {"name": t["name"], "args": json.dumps(t["args"]), "id": t["id"], "index": i}
+            for i, t in enumerate(reply.tool_calls)
+        ]
+        if tool_call_chunks:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks))
+
+
+@pytest.fixture
+def scripted_agent(transactions_path, monkeypatch):
+    """The model says something, calls a tool, then answers with the tool's result."""
+
+    model = ScriptedChat(
+        replies=[
+            AIMessage(
+                content="Let me check.",
+                tool_calls=[{"name": "query_finances", "args": {"op": "total_expenses"}, "id": "call_1"}],
+            ),
+            AIMessage(content="You spent $115.50."),
+        ]
+    )
+    monkeypatch.setattr(graph, "_get_llm", lambda model_name: model)
+
+
+async def test_run_agent_returns_final_answer(scripted_agent) -> None:
+    """Text sent alongside tool calls is not part of the answer."""
+    assert await graph.run_agent("Break down my spending") == "You spent $115.50."
+
+
+async def test_run_agent_stream_separates_steps(scripted_agent) -> None:
+    """Text already streamed before a tool call is kept apart from the answer."""
+    deltas = [d async for d in graph.run_agent_stream("Break down my spending")]
+    assert "".join(deltas) == "Let me check.\nYou spent $115.50."
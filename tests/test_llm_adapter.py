@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("livekit.agents")
+
+from src import llm_adapter  # noqa: E402
+
+
+class Recorder:
+    """Stands in for the stream's event channel and keeps what was sent, and when."""
+
+    def __init__(self):
+        self.sent = []
+        self.times = []
+
+    async def send(self, chunk) -> None:
+        self.sent.append(chunk.delta.content)
+        self.times.append(time.monotonic())
+
+
+def _agent(deltas, delay: float = 0.0, pauses: dict | None = None):
+    """Fake run_agent_stream yielding deltas, sleeping delay before each or pauses[i] before the i-th."""
+    closed = []
+
+    async def run_agent_stream(user_input, history):
+        try:
+            for i, delta in enumerate(deltas):
+                await asyncio.sleep((pauses or {}).get(i, delay))
+                yield delta
+        finally:
+            closed.append(True)
+
+    return run_agent_stream, closed
+
+
+async def _stream(monkeypatch, deltas, **kwargs) -> Recorder:
+    agent, _ = _agent(deltas, **kwargs)
+    monkeypatch.setattr(llm_adapter, "run_agent_stream", agent)
+    events = Recorder()
+    parts = []
+    await llm_adapter.GraphLLMStream._stream_answer(SimpleNamespace(_event_ch=events), "q", [], "chunk_1", parts)
+    assert "".join(parts) == "".join(deltas)
+    return events
+
+
+async def test_flushes_first_token_phrases_and_newlines(monkeypatch) -> None:
+    """The first token goes out alone; phrases end at punctuation before whitespace or at a newline."""
+    deltas = ["Your", " total", " is", " $", "1", ",", "446", ".", "39", ".", " Next", " line", "\n", "End"]
+    events = await _stream(monkeypatch, deltas)
+    assert events.sent == ["Your", " total is $1,446.39.", " Next line\n", "End"]
+
+
+async def test_flushes_steady_tokens_every_interval(monkeypatch) -> None:
+    """Tokens arriving faster than FLUSH_INTERVAL are batched rather than sent one by one."""
+    deltas = ["a"] + [" b"] * 15
+    events = await _stream(monkeypatch, deltas, delay=0.01)
+    assert events.sent[0] == "a"
+    assert 2 < len(events.sent) < len(deltas)
+
+
+async def test_flushes_buffer_when_next_token_is_late(monkeypatch) -> None:
+    """Buffered text is sent after FLUSH_INTERVAL even if the next token takes much longer."""
+    start = time.monotonic()
+    events = await _stream(monkeypatch, ["Checking", " the", " numbers", " now"], pauses={3: 0.5})
+    assert events.sent == ["Checking", " the numbers", " now"]
+    assert events.times[1] - start < 0.25
+
+
+async def test_empty_answer_sends_nothing(monkeypatch) -> None:
+    events = await _stream(monkeypatch, [])
+    assert events.sent == []
+
+
+async def test_first_token_deadline(monkeypatch) -> None:
+    """A turn that stays silent past FIRST_TOKEN_TIMEOUT times out and the agent stream is closed."""
+    agent, closed = _agent(["late"], delay=1.0)
+    monkeypatch.setattr(llm_adapter, "run_agent_stream", agent)
+    monkeypatch.setattr(llm_adapter, "FIRST_TOKEN_TIMEOUT", 0.05)
+    events = Recorder()
+    with pytest.raises(asyncio.TimeoutError):
+        await llm_adapter.GraphLLMStream._stream_answer(SimpleNamespace(_event_ch=events), "q", [], "chunk_1", [])
+    assert events.sent == []
+    assert closed == [True]
+
+
+def _turn(events: Recorder):
+    """Stand-in for a GraphLLMStream whose chat context ends with a user question."""
+    stream = SimpleNamespace(
+        _event_ch=events,
+        _chat_ctx=SimpleNamespace(messages=lambda: [SimpleNamespace(role="user", text_content="q")]),
+    )
+    stream._stream_answer = functools.partial(llm_adapter.GraphLLMStream._stream_answer, stream)
+    return stream
+
+
+@pytest.mark.parametrize(("silent_attempts", "expected"), [(1, ["recovered"]), (2, ["Sorry, that took too long. Please try asking again."])])
+async def test_silent_turn_is_retried_once(monkeypatch, silent_attempts, expected) -> None:
+    """A turn with no first token by the deadline is restarted once, then apologised for."""
+    calls = []
+
+    async def run_agent_stream(user_input, history):
+        calls.append(user_input)
+        if len(calls) <= silent_attempts:
+            await asyncio.sleep(1.0)
+        yield "recovered"
+
+    monkeypatch.setattr(llm_adapter, "run_agent_stream", run_agent_stream)
+    monkeypatch.setattr(llm_adapter, "FIRST_TOKEN_TIMEOUT", 0.05)
+    events = Recorder()
+    await llm_adapter.GraphLLMStream._run(_turn(events))
+    assert events.sent == expected
+    assert len(calls) == 2